@@ -1,10 +1,19 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.uploaded_file_manager import UploadedFile
 import FinanceDataReader as fdr
+import requests
+from requests.adapters import HTTPAdapter
+import importlib
+import io
 import pandas as pd
+import numpy as np
 import datetime
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import shutil
 try:
     import OpenDartReader
 except ImportError:
@@ -15,17 +24,71 @@ st.set_page_config(layout="wide", page_title="주식 백테스팅 & 검색기")
 
 # --- 유틸리티 함수 ---
 
-@st.cache_data
+# 전체 종목 스캔 시 동시에 실행할 작업 수 (네트워크 I/O 위주라 CPU 코어 수보다 크게 잡음)
+SCAN_MAX_WORKERS = 24
+# OpenDART API에 동시에 보낼 수 있는 최대 요청 수 (스캔 작업 수와 별개로 제한)
+DART_MAX_CONCURRENCY = 4
+
+# 종목별 시세를 저장하는 로컬 Parquet 캐시 폴더 (앱을 재시작해도 유지)
+OHLCV_CACHE_DIR = 'cache'
+# 종목/연도/보고서별 DART 재무제표를 저장하는 로컬 Parquet 캐시 폴더
+DART_CACHE_DIR = os.path.join(OHLCV_CACHE_DIR, 'dart')
+# 정정공시가 나올 수 있는 최근 사업연도(올해 포함 이전 N년)의 DART 캐시는 일정 기간이 지나면 다시 조회
+DART_REFRESH_YEARS = 2
+DART_REFRESH_DAYS = 30
+# 캐시 이어받기 때 수정주가 기준 변경(분할/증자 등)을 확인하려고 겹쳐 받는 마지막 거래일 수
+OHLCV_OVERLAP_BARS = 5
+# 백테스트 조건 계산에 실제로 사용하는 시세 열
+OHLCV_COLUMNS = ['Open', 'Close', 'Volume']
+
+# 주가 등락률(%) / 전일 대비 거래량 변화율(%) 조건의 범위: (하한 이상, 상한 미만)
+CHANGE_RANGES = {'3~5': (3, 5), '5~7': (5, 7), '7~9': (7, 9), '9이상': (9, float('inf'))}
+VOLUME_RANGES = {'100~200': (100, 200), '200~300': (200, 300), '300이상': (300, float('inf'))}
+
+# 재무제표 계정명 동의어 → 표준 명칭 (공백 제거 후 비교)
+ACCOUNT_SYNONYMS = {
+    '매출액': '매출액', '수익(매출액)': '매출액', '매출': '매출액',
+    '영업이익': '영업이익', '영업이익(손실)': '영업이익',
+    # 법인세비용차감전계속영업이익은 차선책
+    '당기순이익': '당기순이익', '당기순이익(손실)': '당기순이익', '연결당기순이익': '당기순이익', '법인세비용차감전계속영업이익': '당기순이익',
+    '자본총계': '자본총계', '자본': '자본총계',
+    '부채총계': '부채총계', '부채': '부채총계',
+}
+
+# 재무 조건/리포트에 사용하는 표준 계정
+TARGET_ACCOUNTS = ['매출액', '영업이익', '당기순이익', '자본총계', '부채총계', '영업활동현금흐름', '유형자산의취득']
+
+# 전체 종목 스캔 결과에 남길 최소 승률(%)
+SCAN_MIN_WIN_RATE = 50.0
+# 전체 종목 스캔 결과 요약표의 열 (scan_single_stock이 반환하는 튜플 순서)
+SCAN_RESULT_COLUMNS = ['종목명', '종목코드', '발생 횟수', '평균 수익률(%)', '승률(%)']
+
+# 보고서 종류별 공시일 (월, 일): 1분기 5/15, 반기 8/14, 3분기 11/14, 사업보고서 다음 해 3/31
+REPORT_RELEASE_MONTH_DAY = {'11013': (5, 15), '11012': (8, 14), '11014': (11, 14), '11011': (3, 31)}
+
+@st.cache_data(ttl=24 * 3600, show_spinner=False)
+def load_stock_listing(market):
+    """시장별 fdr.StockListing 결과를 하루 동안 캐시합니다. ('전체'와 업로드 파일 조합에서도 시장별로 재사용)"""
+    return fdr.StockListing(market)[['Code', 'Name']]
+
+def hash_uploaded_file(uploaded_file):
+    """업로드 파일의 캐시 키. 재실행마다 파일 내용 전체를 해시하지 않도록 (file_id, 이름, 크기)만 사용합니다."""
+    return (uploaded_file.file_id, uploaded_file.name, uploaded_file.size)
+
+# 시장 종목 리스트는 하루 단위로만 바뀌므로 하루 동안 캐시
+@st.cache_data(ttl=24 * 3600, hash_funcs={UploadedFile: hash_uploaded_file})
 def get_stock_list(market_type=None, uploaded_file=None):
     """KOSPI/KOSDAQ 종목 리스트를 가져오거나 업로드된 CSV를 읽습니다."""
     # 1. 사용자 업로드 파일 우선
     if uploaded_file is not None:
         try:
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, dtype={'Code': str})
-        except UnicodeDecodeError:
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, dtype={'Code': str}, encoding='cp949')
+            # 파일은 한 번만 읽고, 인코딩 판별은 바이트 디코딩으로만 수행 (CSV 파싱은 1회)
+            raw = uploaded_file.getvalue()
+            try:
+                text = raw.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                text = raw.decode('cp949')
+            df = pd.read_csv(io.StringIO(text), dtype={'Code': str})
         except Exception as e:
             st.error(f"파일 읽기 오류: {e}")
             return pd.DataFrame()
@@ -39,18 +102,20 @@ def get_stock_list(market_type=None, uploaded_file=None):
     # 2. 시장 데이터 가져오기 (업로드 파일이 없을 때만 실행)
     try:
         if market_type == "KOSPI":
-            df = fdr.StockListing('KOSPI')
+            df = load_stock_listing('KOSPI')
         elif market_type == "KOSDAQ":
-            df = fdr.StockListing('KOSDAQ')
+            df = load_stock_listing('KOSDAQ')
         else:
-            df_kospi = fdr.StockListing('KOSPI')
-            df_kosdaq = fdr.StockListing('KOSDAQ')
-            df_total = pd.concat([df_kospi, df_kosdaq])
-            return df_total[['Code', 'Name']]
+            # 시장별 목록은 이미 캐시되어 있고 Code/Name만 담고 있으므로 이어 붙이기만 함
+            return pd.concat([load_stock_listing('KOSPI'), load_stock_listing('KOSDAQ')], ignore_index=True)
             
         return df[['Code', 'Name']]
     except Exception as e:
-        # Fallback to local CSV if available
+        # Fallback to local files if available (check_source.py가 저장한 Parquet 스냅샷 → CSV 순)
+        try:
+            return pd.read_parquet('kospi_stocks.parquet', columns=['Code', 'Name'])
+        except Exception:
+            pass
         try:
             return pd.read_csv('kospi_stocks.csv', dtype={'Code': str})
         except:
@@ -61,101 +126,244 @@ def get_stock_list(market_type=None, uploaded_file=None):
             }
             return pd.DataFrame(data)
 
+# 라벨 매핑은 읽기 전용이므로 재실행마다 복사되지 않도록 리소스로 캐시 (종목 리스트와 같은 키/주기)
+@st.cache_resource(ttl=24 * 3600, hash_funcs={UploadedFile: hash_uploaded_file}, show_spinner=False)
+def get_stock_choices(market_type=None, uploaded_file=None):
+    """종목 검색용 "종목명 (코드)" 라벨 → (종목명, 코드) 매핑을 만듭니다. (행별 apply 대신 열 단위 문자열 연산)"""
+    stock_list = get_stock_list(market_type, uploaded_file)
+    if stock_list.empty:
+        return {}
+    names = stock_list['Name'].astype(str)
+    codes = stock_list['Code'].astype(str)
+    return dict(zip(names + ' (' + codes + ')', zip(names, codes)))
+
+# 종목 수도 종목 리스트와 같은 키/주기로 캐시 (리소스 캐시라 재실행마다 종목 리스트를 복사하지 않음)
+@st.cache_resource(ttl=24 * 3600, hash_funcs={UploadedFile: hash_uploaded_file}, show_spinner=False)
+def get_stock_count(market_type=None, uploaded_file=None):
+    """검색 대상 종목 수 슬라이더의 최대값. (종목 리스트가 비어 있으면 200)"""
+    stock_list = get_stock_list(market_type, uploaded_file)
+    return len(stock_list) if not stock_list.empty else 200
+
 def calculate_mas(df, periods=[5, 20, 60, 120]):
     """이동평균선을 계산합니다. periods 리스트에 있는 기간들을 계산합니다."""
+    # 누적합을 한 번만 구해 모든 기간의 이동평균에 재사용 (기간별 rolling 반복 대비 Close를 한 번만 순회)
+    # 국내 주가는 정수(원)이므로 float64 누적합의 구간 차이는 오차 없이 rolling 평균과 동일
+    close = df['Close'].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(close)
+    if not np.all(np.mod(close[valid], 1) == 0):
+        # 소수점 가격(야후 등 해외 시세)은 누적합 차이에 반올림 오차가 쌓이므로 기간별 rolling 평균 사용
+        for p in periods:
+            df[f'MA{p}'] = df['Close'].rolling(window=p).mean()
+        return df
+    csum = np.concatenate(([0.0], np.cumsum(np.where(valid, close, 0.0))))
+    ccnt = np.concatenate(([0], np.cumsum(valid)))
+
+    n = len(close)
     for p in periods:
-        df[f'MA{p}'] = df['Close'].rolling(window=p).mean()
+        ma = np.full(n, np.nan)
+        if p <= n:
+            # 구간 내 결측치가 있으면 rolling(window=p)과 동일하게 NaN
+            full = (ccnt[p:] - ccnt[:-p]) == p
+            ma[p-1:] = np.where(full, (csum[p:] - csum[:-p]) / p, np.nan)
+        df[f'MA{p}'] = ma
     return df
 
+def pct_change_array(values):
+    """전일 대비 변화율(%)을 numpy 배열로 계산합니다. (Series.pct_change() * 100과 동일, 첫 값은 NaN)"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty(len(values))
+    out[:1] = np.nan
+    # 결과 버퍼에 바로 나눗셈/뺄셈/곱셈을 수행해 중간 배열을 만들지 않음
+    rest = out[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(values[1:], values[:-1], out=rest)
+    rest -= 1
+    rest *= 100
+    return out
+
+def required_ma_periods(condition):
+    """조건에 쓰이는 이동평균 기간들을 set으로 반환합니다."""
+    ma_periods = set()
+    
+    if 'ma' in condition:
+        ma_periods.add(condition['ma']['ma1'])
+        ma_periods.add(condition['ma']['ma2'])
+        ma_periods.add(condition['ma']['ma3'])
+    
+    if 'ma_cross' in condition:
+        ma_periods.add(condition['ma_cross']['ma1'])
+        ma_periods.add(condition['ma_cross']['ma2'])
+    
+    if 'breakout' in condition:
+        ma_periods.add(condition['breakout']['target_ma'])
+    
+    return ma_periods
+
 def check_conditions(df, params):
     """선택된 조건들을 모두 만족하는 시점을 찾아 Boolean Series로 반환합니다."""
-    # 데이터가 충분하지 않으면 False 반환
-    if len(df) < 120:
-        return pd.Series([False] * len(df), index=df.index)
+    # 선택된 조건이 없거나 데이터가 충분하지 않으면 False 반환 (조건 없이 모든 날짜가 신호로 잡히지 않도록)
+    if not params or len(df) < 120:
+        return pd.Series(np.zeros(len(df), dtype=bool), index=df.index, copy=False)
+
+    # 가장 긴 이평선이 처음 계산되는 날 이전은 이평선이 NaN이라 항상 False이므로 비교에서 제외
+    # (전일 값이 필요한 크로스/등락/거래량 조건을 위해 그 하루 전부터 계산)
+    start = max(max(required_ma_periods(params), default=1) - 2, 0)
+    view = df.iloc[start:]
 
     # 기본 마스크 (모두 True로 시작 -> AND 연산)
-    combined_mask = pd.Series([True] * len(df), index=df.index)
+    # 조건별 마스크는 numpy 배열로 만들고, 하나의 버퍼에 제자리(in-place) AND 하여 중간 Series 생성을 줄임
+    combined_mask = np.ones(len(view), dtype=bool)
     
     # 1. 이평선(일)
     if 'ma' in params:
         p = params['ma']
+        ma1 = view[f'MA{p["ma1"]}'].to_numpy()
+        ma2 = view[f'MA{p["ma2"]}'].to_numpy()
+        ma3 = view[f'MA{p["ma3"]}'].to_numpy()
         # 예: MA20 > MA60 > MA120
-        mask = (df[f'MA{p["ma1"]}'] > df[f'MA{p["ma2"]}']) & (df[f'MA{p["ma2"]}'] > df[f'MA{p["ma3"]}'])
-        combined_mask = combined_mask & mask
+        np.logical_and(combined_mask, ma1 > ma2, out=combined_mask)
+        np.logical_and(combined_mask, ma2 > ma3, out=combined_mask)
 
     # 1.5 이평선 돌파(일) - MA Cross (크로스 발생 시점 체크)
     if 'ma_cross' in params:
         p = params['ma_cross']
-        ma1_col = df[f'MA{p["ma1"]}']
-        ma2_col = df[f'MA{p["ma2"]}']
-        
-        # 이전 날짜 데이터 (shift 1)
-        prev_ma1 = ma1_col.shift(1)
-        prev_ma2 = ma2_col.shift(1)
+        ma1 = view[f'MA{p["ma1"]}'].to_numpy()
+        ma2 = view[f'MA{p["ma2"]}'].to_numpy()
         
+        # 이전 날짜 데이터는 한 칸 앞 슬라이스로 비교 (첫날은 전일 데이터가 없으므로 False)
+        mask = np.zeros(len(view), dtype=bool)
         if p['operator'] == '>':
             # 골든크로스: 어제는 ma1 < ma2 였다가, 오늘은 ma1 > ma2
-            mask = (prev_ma1 <= prev_ma2) & (ma1_col > ma2_col)
+            mask[1:] = (ma1[:-1] <= ma2[:-1]) & (ma1[1:] > ma2[1:])
         else:
             # 데드크로스: 어제는 ma1 > ma2 였다가, 오늘은 ma1 < ma2
-            mask = (prev_ma1 >= prev_ma2) & (ma1_col < ma2_col)
+            mask[1:] = (ma1[:-1] >= ma2[:-1]) & (ma1[1:] < ma2[1:])
             
-        combined_mask = combined_mask & mask
+        np.logical_and(combined_mask, mask, out=combined_mask)
 
     # 2. 주가 돌파(일)
     if 'breakout' in params:
         p = params['breakout']
         # 시가/종가 컬럼 매핑
         col_map = {'시가': 'Open', '종가': 'Close'}
-        price_col = df[col_map[p['price_type']]]
-        ma_col = df[f'MA{p["target_ma"]}']
+        price_col = view[col_map[p['price_type']]].to_numpy()
+        ma_col = view[f'MA{p["target_ma"]}'].to_numpy()
         
         if p['operator'] == '>':
             mask = price_col > ma_col
         else: # '<'
             mask = price_col < ma_col
-        combined_mask = combined_mask & mask
+        np.logical_and(combined_mask, mask, out=combined_mask)
 
     # 3. 주가 등락(일)
     if 'change' in params:
         p = params['change']
         # 등락률 계산: (오늘 종가 - 어제 종가) / 어제 종가 * 100
-        daily_ret = df['Close'].pct_change() * 100
+        daily_ret = pct_change_array(view['Close'].to_numpy())
         
-        r_min, r_max = 0, float('inf')
-        if p['range'] == '3~5': r_min, r_max = 3, 5
-        elif p['range'] == '5~7': r_min, r_max = 5, 7
-        elif p['range'] == '7~9': r_min, r_max = 7, 9
-        elif p['range'] == '9이상': r_min = 9
+        r_min, r_max = CHANGE_RANGES.get(p['range'], (0, float('inf')))
 
         if p['direction'] == '상승':
             mask = (daily_ret >= r_min) & (daily_ret < r_max)
         else: # 하락 (절대값 비교)
             mask = (daily_ret <= -r_min) & (daily_ret > -r_max)
-        combined_mask = combined_mask & mask
+        np.logical_and(combined_mask, mask, out=combined_mask)
 
     # 4. 거래량(일)
     if 'volume' in params:
         p = params['volume']
         # 거래량 변화율
-        vol_change = df['Volume'].pct_change() * 100
+        vol_change = pct_change_array(view['Volume'].to_numpy())
         
-        v_min, v_max = 0, float('inf')
-        if p['range'] == '100~200': v_min, v_max = 100, 200
-        elif p['range'] == '200~300': v_min, v_max = 200, 300
-        elif p['range'] == '300이상': v_min = 300
+        v_min, v_max = VOLUME_RANGES.get(p['range'], (0, float('inf')))
         
         if p['direction'] == '상승':
             mask = (vol_change >= v_min) & (vol_change < v_max)
         else: # 하락
             mask = (vol_change <= -v_min) & (vol_change > -v_max)
-        combined_mask = combined_mask & mask
+        np.logical_and(combined_mask, mask, out=combined_mask)
         
     # 6. 기본적 분석 (전처리된 컬럼 사용)
-    if 'fundamental' in params and 'Fundamental' in df.columns:
-        combined_mask = combined_mask & df['Fundamental']
+    if 'fundamental' in params and 'Fundamental' in view.columns:
+        np.logical_and(combined_mask, view['Fundamental'].to_numpy(dtype=bool), out=combined_mask)
+
+    signal = np.zeros(len(df), dtype=bool)
+    signal[start:] = combined_mask
+    # 마스크 버퍼는 이 함수에서만 만든 것이므로 복사 없이 Series로 감쌈 (pandas 3은 기본적으로 배열을 복사)
+    return pd.Series(signal, index=df.index, copy=False)
+
+def normalize_account_names(account_nm):
+    """계정명 Series를 표준 명칭으로 변환합니다. (공백 제거 → 동의어 사전 → 부분 일치 규칙 순, 행별 함수 호출 없음)"""
+    nm = account_nm.str.replace(' ', '', regex=False)
+    norm = nm.map(ACCOUNT_SYNONYMS)
+    
+    # 영업활동으로인한현금흐름 등
+    is_ocf = nm.str.contains('영업활동', regex=False, na=False) & nm.str.contains('현금흐름', regex=False, na=False)
+    norm = norm.mask(norm.isna() & is_ocf, '영업활동현금흐름')
+    # 유형자산의 취득, 유형자산의증가
+    is_capex = nm.str.contains('유형자산', regex=False, na=False) & (
+        nm.str.contains('취득', regex=False, na=False) | nm.str.contains('증가', regex=False, na=False))
+    norm = norm.mask(norm.isna() & is_capex, '유형자산의취득')
+    
+    # 해당 없는 계정은 공백만 제거한 이름 유지
+    return norm.fillna(nm)
+
+@st.cache_resource
+def get_dart_semaphore():
+    """DART API 동시 요청 제한. 세션 간에 공유되도록 리소스로 보관합니다."""
+    return threading.Semaphore(DART_MAX_CONCURRENCY)
+
+@st.cache_resource
+def get_dart_reader(api_key):
+    """API Key별 OpenDartReader 인스턴스. 생성 시 기업 코드 목록을 내려받으므로 한 번만 만들어 재사용합니다."""
+    return OpenDartReader(api_key)
 
-    return combined_mask
+def load_finstate(dart, stock_code, year, reprt_code):
+    """
+    정기보고서 한 건의 재무제표를 가져옵니다.
+    공시된 보고서는 로컬 Parquet에 저장해 두고 앱을 재시작해도 다시 조회하지 않습니다.
+    다만 최근 DART_REFRESH_YEARS년 보고서는 정정공시를 반영하도록 저장 후 DART_REFRESH_DAYS일이 지나면 다시 조회합니다.
+    (그 이전 연도의 정정공시는 반영되지 않으므로 필요하면 clear_dart_cache로 캐시를 비움)
+    """
+    path = os.path.join(DART_CACHE_DIR, f"{stock_code}_{year}_{reprt_code}.parquet")
+    cached = None
+    if os.path.exists(path):
+        try:
+            cached = pd.read_parquet(path)
+        except Exception:
+            pass # 손상된 캐시는 무시하고 새로 받음
+        else:
+            recent = int(year) >= datetime.date.today().year - DART_REFRESH_YEARS
+            age_days = (time.time() - os.path.getmtime(path)) / 86400
+            if not recent or age_days < DART_REFRESH_DAYS:
+                return cached
+
+    # 스캔 스레드가 많아도 DART API 동시 요청 수는 제한 (호출 한도/차단 방지)
+    with get_dart_semaphore():
+        df = dart.finstate(corp=stock_code, bsns_year=str(year), reprt_code=reprt_code)
+
+    # 다시 조회한 결과가 비어 있으면(일시적 오류 등) 기존 캐시를 그대로 사용
+    if (df is None or df.empty) and cached is not None:
+        return cached
+
+    # 아직 공시되지 않은 보고서(빈 결과)는 저장하지 않아 다음 조회 때 다시 확인
+    if df is not None and not df.empty:
+        try:
+            os.makedirs(DART_CACHE_DIR, exist_ok=True)
+            tmp_path = path + '.tmp'
+            df.to_parquet(tmp_path, compression='zstd')
+            os.replace(tmp_path, path)
+        except Exception:
+            pass # 디스크 캐시 저장 실패는 무시
+
+    return df
+
+def clear_dart_cache():
+    """DART 재무제표 디스크 캐시와 이를 사용하는 메모리 캐시를 비웁니다. (정정공시 반영 등)"""
+    shutil.rmtree(DART_CACHE_DIR, ignore_errors=True)
+    get_fundamental_data.clear()
+    compute_fund_results.clear()
+    compute_signals.clear()
 
 @st.cache_data
 def get_fundamental_data(api_key, stock_code, start_year, end_year):
@@ -164,73 +372,73 @@ def get_fundamental_data(api_key, stock_code, start_year, end_year):
         return None
     
     try:
-        dart = OpenDartReader(api_key)
+        dart = get_dart_reader(api_key)
         # 최근 3~4년 데이터 조회 (분기보고서 포함)
         # 11013: 1분기, 11012: 반기, 11014: 3분기, 11011: 사업보고서
         report_codes = ['11013', '11012', '11014', '11011']
+        reports = [(year, code) for year in range(start_year, end_year + 1) for code in report_codes]
         
-        all_data = []
-        for year in range(start_year, end_year + 1):
-            for code in report_codes:
-                try:
-                    df = dart.finstate(corp=stock_code, bsns_year=str(year), reprt_code=code)
-                    if df is not None and not df.empty:
-                        # 1. CFS(연결) 우선, 없으면 OFS(별도) 사용
-                        if 'CFS' in df['fs_div'].unique():
-                            df = df[df['fs_div'] == 'CFS']
-                        else:
-                            df = df[df['fs_div'] == 'OFS']
-                        
-                        # 2. 계정명 표준화 (동의어 처리)
-                        # 목표 계정: 매출액, 영업이익, 당기순이익, 자본총계, 부채총계, 영업활동현금흐름, 유형자산의취득
-                        
-                        # 표준화 함수
-                        def normalize_account_nm(nm):
-                            nm = nm.replace(' ', '') # 공백 제거
-                            if nm in ['매출액', '수익(매출액)', '매출']: return '매출액'
-                            if nm in ['영업이익', '영업이익(손실)']: return '영업이익'
-                            if nm in ['당기순이익', '당기순이익(손실)', '연결당기순이익', '법인세비용차감전계속영업이익']: return '당기순이익' # 법인세...는 차선책
-                            if nm in ['자본총계', '자본']: return '자본총계'
-                            if nm in ['부채총계', '부채']: return '부채총계'
-                            if '영업활동' in nm and '현금흐름' in nm: return '영업활동현금흐름' # 영업활동으로인한현금흐름 등
-                            if '유형자산' in nm and ('취득' in nm or '증가' in nm): return '유형자산의취득' # 유형자산의 취득, 유형자산의증가
-                            return nm
-                            
-                        df['account_nm_norm'] = df['account_nm'].apply(normalize_account_nm)
-                        
-                        target_accounts = ['매출액', '영업이익', '당기순이익', '자본총계', '부채총계', '영업활동현금흐름', '유형자산의취득']
-                        
-                        # 필터링
-                        df_filtered = df[df['account_nm_norm'].isin(target_accounts)].copy()
-                        
-                        if not df_filtered.empty:
-                            # 중복 제거 (같은 표준 명칭이 여러 개일 경우, 첫 번째 것 사용하거나 우선순위)
-                            df_filtered = df_filtered.drop_duplicates(subset=['account_nm_norm'], keep='first')
-                            
-                            df_filtered['account_nm'] = df_filtered['account_nm_norm'] # 표준 명칭으로 덮어쓰기
-                            df_filtered = df_filtered.drop(columns=['account_nm_norm'])
-                            
-                            df_filtered['year'] = year
-                            df_filtered['reprt_code'] = code
-                            all_data.append(df_filtered)
-                except:
-                    continue
-                    
-        if not all_data:
+        def fetch_report(report):
+            try:
+                return load_finstate(dart, stock_code, *report)
+            except Exception:
+                return None # 한 보고서 조회 실패로 전체가 중단되지 않도록 건너뜀
+        
+        # 보고서별 요청은 서로 독립적이므로 동시에 조회 (실제 동시 요청 수는 get_dart_semaphore로 제한)
+        with ThreadPoolExecutor(
+            max_workers=DART_MAX_CONCURRENCY,
+            initializer=add_script_run_ctx,
+            initargs=(None, get_script_run_ctx()),
+        ) as executor:
+            report_dfs = list(executor.map(fetch_report, reports))
+        
+        # 보고서별로 가공하지 않고 원본을 한 번에 합친 뒤 전체를 열 단위로 처리
+        frames = [df.assign(year=year, reprt_code=code)
+                  for (year, code), df in zip(reports, report_dfs) if df is not None and not df.empty]
+        if not frames:
+            return None
+        raw = pd.concat(frames, ignore_index=True)
+        
+        # 1. 보고서별로 CFS(연결) 우선, 없으면 OFS(별도) 사용
+        is_cfs = raw['fs_div'] == 'CFS'
+        report_has_cfs = is_cfs.groupby([raw['year'], raw['reprt_code']]).transform('any')
+        raw = raw[raw['fs_div'] == np.where(report_has_cfs, 'CFS', 'OFS')]
+        
+        # 2. 계정명 표준화 (동의어 처리) 후 표준 명칭으로 덮어쓰기
+        raw['account_nm'] = normalize_account_names(raw['account_nm'])
+        
+        # 3. 목표 계정만 필터링, 보고서 안에서 같은 표준 명칭이 여러 개면 첫 번째 것 사용
+        final_df = raw[raw['account_nm'].isin(TARGET_ACCOUNTS)]
+        final_df = final_df.drop_duplicates(subset=['year', 'reprt_code', 'account_nm'], keep='first')
+        
+        if final_df.empty:
             return None
-            
-        final_df = pd.concat(all_data)
         return final_df
     except Exception as e:
         return None
 
+def fill_report_ranges(date_index, dates, hits):
+    """
+    조건을 만족한 보고서의 공시일부터 다음 보고서 공시일 전날까지 True인 배열 생성
+    dates: 공시일 순으로 정렬된 배열, hits: 보고서별 조건 만족 여부
+    """
+    # 마지막 보고서는 이후 모든 날짜까지 유효
+    starts = date_index.searchsorted(dates[hits])
+    ends = np.append(date_index.searchsorted(dates[1:]), len(date_index))[hits]
+
+    # 구간 시작에 +1, 끝에 -1을 더한 누적합으로 여러 구간을 한 번에 채움
+    delta = np.zeros(len(date_index) + 1, dtype=np.int64)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    return np.cumsum(delta[:-1]) > 0
+
 def calculate_growth_mask(df_main, item_name, period_type, n_percent, date_index):
     """
     특정 항목의 성장률 조건을 만족하는지 확인하는 마스크 생성
     period_type: 'year' or 'quarter'
     """
     # 데이터 준비
-    df_item = df_main[df_main['account_nm'] == item_name].copy()
+    df_item = df_main[df_main['account_nm'] == item_name]
     if df_item.empty:
         return pd.Series(False, index=date_index)
         
@@ -239,7 +447,7 @@ def calculate_growth_mask(df_main, item_name, period_type, n_percent, date_index
     # 연간/분기 구분
     if period_type == 'year':
         # 사업보고서(11011)만 필터링
-        df_target = df_item[df_item['reprt_code'] == '11011'].copy()
+        df_target = df_item[df_item['reprt_code'] == '11011']
         df_target = df_target.sort_values('year')
         df_target = df_target.drop_duplicates(subset=['year'], keep='last')
         
@@ -247,78 +455,71 @@ def calculate_growth_mask(df_main, item_name, period_type, n_percent, date_index
         # 모든 보고서 사용 (단순 시계열)
         df_target = df_item.sort_values('release_date')
 
-    # 결과 마스크
-    result_mask = pd.Series(False, index=date_index)
-    
-    values = df_target['amount'].values
-    dates = df_target['release_date'].values
+    values = df_target['amount'].to_numpy(dtype=np.float64, na_value=np.nan)
+    dates = df_target['release_date'].to_numpy()
     
     if len(values) < 4: 
         return pd.Series(False, index=date_index)
 
-    # 마스크 업데이트
-    for i in range(3, len(values)):
-        v0, v1, v2, v3 = values[i-3], values[i-2], values[i-1], values[i]
-        
-        # 성장률 조건 (n% 이상)
-        try:
-            g1 = (v1 - v0) / abs(v0) * 100 if v0 != 0 else 0
-            g2 = (v2 - v1) / abs(v1) * 100 if v1 != 0 else 0
-            g3 = (v3 - v2) / abs(v2) * 100 if v2 != 0 else 0
-            
-            if g1 >= n_percent and g2 >= n_percent and g3 >= n_percent:
-                start_dt = dates[i]
-                next_dt = dates[i+1] if i+1 < len(dates) else None
-                
-                if next_dt:
-                    result_mask.loc[(result_mask.index >= start_dt) & (result_mask.index < next_dt)] = True
-                else:
-                     result_mask.loc[result_mask.index >= start_dt] = True
-                     
-        except:
-            pass
-            
-    return result_mask
+    # 연속된 세 구간의 성장률을 한 번에 계산 (직전 값이 0이면 성장률 0으로 처리)
+    prev, curr = values[:-1], values[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(prev != 0, (curr - prev) / np.abs(prev) * 100, 0)
+    meets = growth >= n_percent
+    # i번째 보고서(i >= 3) 기준 직전 3개 성장률이 모두 n% 이상인지
+    hits = np.zeros(len(values), dtype=bool)
+    hits[3:] = meets[:-2] & meets[1:-1] & meets[2:]
+
+    return pd.Series(fill_report_ranges(date_index, dates, hits), index=date_index)
 
 def calculate_surplus_mask(df_main, item_name, period_type, date_index):
     """
     특정 항목의 흑자(>0) 지속 여부를 확인하는 마스크 생성
     """
-    df_item = df_main[df_main['account_nm'] == item_name].copy()
+    df_item = df_main[df_main['account_nm'] == item_name]
     if df_item.empty:
         return pd.Series(False, index=date_index)
         
     df_item = df_item.sort_values('release_date')
     
     if period_type == 'year':
-        df_target = df_item[df_item['reprt_code'] == '11011'].copy()
+        df_target = df_item[df_item['reprt_code'] == '11011']
         df_target = df_target.sort_values('year')
         df_target = df_target.drop_duplicates(subset=['year'], keep='last')
     else: 
         df_target = df_item.sort_values('release_date')
 
-    result_mask = pd.Series(False, index=date_index)
-    
-    values = df_target['amount'].values
-    dates = df_target['release_date'].values
+    values = df_target['amount'].to_numpy(dtype=np.float64, na_value=np.nan)
+    dates = df_target['release_date'].to_numpy()
     
     if len(values) < 3: 
         return pd.Series(False, index=date_index)
 
-    # 3년/3분기 연속 흑자
-    for i in range(2, len(values)):
-        v0, v1, v2 = values[i-2], values[i-1], values[i]
-        
-        if v0 > 0 and v1 > 0 and v2 > 0:
-            start_dt = dates[i]
-            next_dt = dates[i+1] if i+1 < len(dates) else None
-            
-            if next_dt:
-                result_mask.loc[(result_mask.index >= start_dt) & (result_mask.index < next_dt)] = True
-            else:
-                 result_mask.loc[result_mask.index >= start_dt] = True
-            
-    return result_mask
+    # 3년/3분기 연속 흑자: i번째 보고서(i >= 2)까지 세 보고서가 모두 0 초과인지 (값 없음은 False)
+    positive = values > 0
+    hits = np.zeros(len(values), dtype=bool)
+    hits[2:] = positive[:-2] & positive[1:-1] & positive[2:]
+
+    return pd.Series(fill_report_ranges(date_index, dates, hits), index=date_index)
+
+def parse_amounts(amounts):
+    """DART 금액 문자열('1,234,567')을 숫자로 변환합니다. (이미 숫자형이면 그대로 사용)"""
+    if pd.api.types.is_numeric_dtype(amounts):
+        return amounts
+    # 정규식 없이 쉼표만 제거 (문자열 열은 pyarrow 기반 str dtype이라 C 경로에서 처리됨)
+    return pd.to_numeric(amounts.str.replace(',', '', regex=False), errors='coerce')
+
+def calculate_release_dates(fund_df):
+    """보고서 연도/종류(reprt_code)로 공시일을 계산합니다. (행별 apply 없이 열 단위로 날짜 생성)"""
+    month_day = fund_df['reprt_code'].map(REPORT_RELEASE_MONTH_DAY)
+    year = fund_df['year'].astype(int)
+    return pd.to_datetime(pd.DataFrame({
+        # 사업보고서(11011)는 다음 해에 공시됨
+        'year': year + (fund_df['reprt_code'] == '11011'),
+        # 알 수 없는 보고서는 해당 연도 말일로 처리
+        'month': month_day.str[0].fillna(12).astype(int),
+        'day': month_day.str[1].fillna(31).astype(int),
+    }))
 
 def process_fundamental_data(date_index, fund_df, params):
     """
@@ -328,78 +529,48 @@ def process_fundamental_data(date_index, fund_df, params):
         return pd.Series(False, index=date_index)
         
     # 금액 컬럼 수치화
-    fund_df['amount'] = pd.to_numeric(fund_df['thstrm_amount'].str.replace(',', ''), errors='coerce')
+    fund_df['amount'] = parse_amounts(fund_df['thstrm_amount'])
     
-    # 영업이익률 계산 및 추가 (매출액, 영업이익 존재 시)
-    try:
-        # 피벗으로 날짜/리포트별 매칭
-        df_p = fund_df.pivot_table(index=['year', 'reprt_code'], columns='account_nm', values='amount', aggfunc='mean').reset_index()
-        if '매출액' in df_p.columns and '영업이익' in df_p.columns:
-            df_p['영업이익률'] = df_p.apply(lambda x: (x['영업이익'] / x['매출액'] * 100) if x['매출액'] != 0 else 0, axis=1)
-            
-            # 원래 형식으로 변환하여 병합 (account_nm: '영업이익률', amount: 계산값)
-            # 다른 컬럼(thstrm_dt 등)은 누락되지만 calculate_growth_mask는 account_nm, amount, year, reprt_code만 씀 (release_date는 나중에 merge or re-cal)
-            # release_date를 위해 원본의 메타데이터가 필요함.
-            # 복잡하므로, fund_df에 있는 release_date 로직을 먼저 수행하고, 그 뒤에 병합
-            pass
-    except:
-        pass
-
     # 공시일 계산
-    def get_release_date(row):
-        y = int(row['year'])
-        rc = row['reprt_code']
-        if rc == '11013': return pd.Timestamp(f"{y}-05-15")
-        elif rc == '11012': return pd.Timestamp(f"{y}-08-14")
-        elif rc == '11014': return pd.Timestamp(f"{y}-11-14")
-        elif rc == '11011': return pd.Timestamp(f"{y+1}-03-31")
-        return pd.Timestamp(f"{y}-12-31")
+    fund_df['release_date'] = calculate_release_dates(fund_df)
 
-    fund_df['release_date'] = fund_df.apply(get_release_date, axis=1)
+    # 보고서(연도, 종류)별로 계정을 열로 펼친 표를 한 번만 만들어 FCF/영업이익률/부채비율 계산에 공유
+    # (get_fundamental_data에서 보고서별 계정 중복을 제거했으므로 집계 없는 pivot 사용)
+    wide = fund_df.pivot(index=['year', 'reprt_code'], columns='account_nm', values=['amount', 'release_date'])
+    amounts = wide['amount'].reindex(columns=TARGET_ACCOUNTS)
+    # 금액이 비어 있어도 계정 행 자체가 있었는지 여부 (공시일은 항상 채워져 있음)
+    present = wide['release_date'].reindex(columns=TARGET_ACCOUNTS).notna()
+    release_dates = wide['release_date'].max(axis=1)
 
     # FCF 계산 (영업활동현금흐름 - 유형자산취득)
     # 유형자산취득은 보통 음수(-)로 표시되거나 양수(+)로 표시됨. (OpenDart 확인 필요하지만, 보통 현금유출은 차감해야 함)
     # 재무제표상 '취득'은 현금 유출이므로, 만약 양수로 표기되어 있다면 OCF - Capex.
     # 만약 음수로 표기되어 있다면 OCF + Capex.
     # 안전하게: OCF - abs(Capex)
-    try:
-        df_ocf = fund_df[fund_df['account_nm']=='영업활동현금흐름'][['year', 'reprt_code', 'amount', 'release_date']].rename(columns={'amount': 'ocf'})
-        # 유형자산의취득이 없으면 0 처리
-        df_capex = fund_df[fund_df['account_nm']=='유형자산의취득'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'capex'})
-        
-        if not df_ocf.empty:
-            if df_capex.empty:
-                df_fcf = df_ocf.copy()
-                df_fcf['fcf'] = df_fcf['ocf']
-            else:
-                df_fcf = pd.merge(df_ocf, df_capex, on=['year', 'reprt_code'], how='left').fillna(0)
-                # Capex is outflow. FCF = OCF - Capital Expenditures.
-                # Assuming 'amount' is absolute value for acquisition in notes, but in CFS statement it might be negative.
-                # Let's assume absolute magnitude subtraction for simplicity in Beta.
-                df_fcf['fcf'] = df_fcf['ocf'] - df_fcf['capex'].abs()
-            
-            df_fcf['account_nm'] = 'FCF'
-            df_fcf['amount'] = df_fcf['fcf']
-            df_fcf = df_fcf[['year', 'reprt_code', 'account_nm', 'amount', 'release_date']]
-            fund_df = pd.concat([fund_df, df_fcf], ignore_index=True)
-    except:
-        pass
-    
-    # 영업이익률 데이터 생성
-    try:
-        df_rev = fund_df[fund_df['account_nm']=='매출액'][['year', 'reprt_code', 'amount', 'release_date']].rename(columns={'amount': 'rev'})
-        df_op = fund_df[fund_df['account_nm']=='영업이익'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'op'})
-        
-        df_margin = pd.merge(df_rev, df_op, on=['year', 'reprt_code'], how='inner')
-        df_margin['amount'] = df_margin.apply(lambda x: (x['op'] / x['rev'] * 100) if x['rev'] != 0 else 0, axis=1)
-        df_margin['account_nm'] = '영업이익률'
-        
-        # 필요한 컬럼만 선택해서 fund_df에 추가
-        df_margin = df_margin[['year', 'reprt_code', 'account_nm', 'amount', 'release_date']]
-        
-        fund_df = pd.concat([fund_df, df_margin], ignore_index=True)
-    except:
-        pass
+    ocf = amounts['영업활동현금흐름']
+    if present['유형자산의취득'].any():
+        # 유형자산의취득이 없는 보고서는 0 처리 (영업활동현금흐름 값이 없을 때도 0)
+        fcf = ocf.fillna(0) - amounts['유형자산의취득'].fillna(0).abs()
+    else:
+        fcf = ocf
+    has_fcf = present['영업활동현금흐름']
+
+    # 영업이익률 계산 (매출액이 0이면 0으로 처리)
+    rev = amounts['매출액'].to_numpy(dtype=np.float64, na_value=np.nan)
+    op = amounts['영업이익'].to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        margin = pd.Series(np.where(rev != 0, op / rev * 100, 0), index=amounts.index)
+    has_margin = present['매출액'] & present['영업이익']
+
+    # 성장성/흑자 조건에서 다른 계정과 같은 방식으로 쓰도록 FCF/영업이익률을 행으로 추가
+    derived = pd.concat([
+        pd.DataFrame({'account_nm': 'FCF', 'amount': fcf, 'release_date': release_dates})[has_fcf],
+        pd.DataFrame({'account_nm': '영업이익률', 'amount': margin, 'release_date': release_dates})[has_margin],
+    ]).reset_index()
+    fund_df = pd.concat([fund_df, derived], ignore_index=True)
+
+    # 부채비율 판정 구간은 값이 하나라도 있는 보고서의 공시일 기준
+    report_has_value = wide['amount'].notna().any(axis=1) | (has_fcf & fcf.notna()) | (has_margin & margin.notna())
     
     # 전체 마스크 (True로 시작)
     final_mask = pd.Series(True, index=date_index)
@@ -419,40 +590,15 @@ def process_fundamental_data(date_index, fund_df, params):
         
         # 부채비율 별도 처리
         if key == 'debt_ratio':
-            df_equity = fund_df[fund_df['account_nm'] == '자본총계'].sort_values('release_date')
-            df_liab = fund_df[fund_df['account_nm'] == '부채총계'].sort_values('release_date')
-            
-            # Simple merge/pivot mechanism
-            # Using unique dates from equity/liab union
-            all_dates = sorted(list(set(df_equity['release_date']) | set(df_liab['release_date'])))
-            
-            ratio_mask = pd.Series(False, index=date_index)
-            
-            # Iterate through time, finding latest equity/liab
-            # Better: pivot table
-            df_pivot = fund_df.pivot_table(index='release_date', columns='account_nm', values='amount', aggfunc='last').sort_index()
-            
-            dates = df_pivot.index
-            for i in range(len(dates)):
-                try:
-                    row = df_pivot.iloc[i]
-                    # Forward fill missing values manually if needed, usually pivot makes NaNs if missing
-                    # Just skip if both not present? Or assume previous?
-                    # Let's assume data is present in same report.
-                    equity = row.get('자본총계')
-                    liab = row.get('부채총계')
-                    
-                    if pd.notna(equity) and pd.notna(liab) and equity > 0:
-                        ratio = (liab / equity) * 100
-                        if ratio <= val:
-                            start_dt = dates[i]
-                            next_dt = dates[i+1] if i+1 < len(dates) else None
-                            if next_dt:
-                                ratio_mask.loc[(ratio_mask.index >= start_dt) & (ratio_mask.index < next_dt)] = True
-                            else:
-                                ratio_mask.loc[ratio_mask.index >= start_dt] = True
-                except:
-                    pass
+            # 공시일 순으로 정렬한 보고서별 자본총계/부채총계로 부채비율을 배열 연산으로 계산
+            order = release_dates[report_has_value].sort_values().index
+            equity = amounts.loc[order, '자본총계'].to_numpy(dtype=np.float64, na_value=np.nan)
+            liab = amounts.loc[order, '부채총계'].to_numpy(dtype=np.float64, na_value=np.nan)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = liab / equity * 100
+            # 자본잠식(자본총계 <= 0)이거나 값이 없는 보고서는 제외 (NaN 비교는 False)
+            hits = (equity > 0) & (ratio <= val)
+            ratio_mask = pd.Series(fill_report_ranges(date_index, release_dates[order].to_numpy(), hits), index=date_index)
             
             final_mask = final_mask & ratio_mask
 
@@ -483,31 +629,281 @@ def process_fundamental_data(date_index, fund_df, params):
 
     return final_mask
 
-def backtest_single_stock(code, name, start_date, end_date, condition, n_days):
-    """단일 종목에 대해 백테스팅을 수행합니다."""
-    # 데이터 로드 (이평선 계산을 위해 앞부분 데이터 여유있게 로드)
-    fetch_start = start_date - datetime.timedelta(days=200) 
-    df = fdr.DataReader(code, fetch_start, end_date)
-    
-    if df.empty:
-        return None, None
+@st.cache_data(ttl=3600, show_spinner=False)
+def compute_fund_results(api_key, code, start_year, end_year):
+    """
+    Tab 1 기본적 분석 리포트의 항목별 판정 결과표를 계산합니다. (재무 데이터가 없으면 None)
+    같은 종목/기간으로 다시 실행될 때 전처리와 판정을 반복하지 않도록 결과표를 캐시합니다.
+    """
+    fund_df = get_fundamental_data(api_key, code, start_year, end_year)
+    if fund_df is None or fund_df.empty:
+        return None
 
-    # 필요한 이평선 기간 추출
-    ma_periods = {5, 20, 60, 120} # 기본 차트용
+    # 데이터 전처리 (금액 수치화, FCF 계산, 영업이익률 계산, 공시일 계산 등)
+    # process_fundamental_data 내부 로직 일부 재사용하거나 별도 처리
+    # 여기서는 화면 표시용이므로 직관적으로 계산
     
-    if 'ma' in condition:
-        ma_periods.add(condition['ma']['ma1'])
-        ma_periods.add(condition['ma']['ma2'])
-        ma_periods.add(condition['ma']['ma3'])
+    # 1. 전처리
+    fund_df['amount'] = parse_amounts(fund_df['thstrm_amount'])
     
-    if 'ma_cross' in condition:
-        ma_periods.add(condition['ma_cross']['ma1'])
-        ma_periods.add(condition['ma_cross']['ma2'])
+    # 공시일(release_date)
+    fund_df['release_date'] = calculate_release_dates(fund_df)
+
+    # 계정별 행을 한 번의 groupby로 나눠 두고 항목별 조회에 재사용 (항목마다 전체 표를 다시 훑지 않음)
+    acct_groups = dict(list(fund_df.groupby('account_nm', sort=False)))
+    no_rows = fund_df.iloc[:0]
+    # 보고서별 공시일 (FCF/영업이익률 행에 붙임)
+    report_dates = fund_df[['year', 'reprt_code', 'release_date']].drop_duplicates()
+
+    # FCF 추가 (fund_df에 이어 붙여 전체를 복사하지 않고 계정별 표에 바로 등록)
+    # 영업활동현금흐름이 있는 보고서에만 계산 (유형자산의취득이 없는 보고서는 0 처리)
+    if '영업활동현금흐름' in acct_groups:
+        df_ocf = acct_groups['영업활동현금흐름'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'ocf'})
+        df_capex = acct_groups.get('유형자산의취득', no_rows)[['year', 'reprt_code', 'amount']].rename(columns={'amount': 'capex'})
+        
+        df_fcf = pd.merge(df_ocf, df_capex, on=['year', 'reprt_code'], how='left').fillna(0)
+        df_fcf['amount'] = df_fcf['ocf'] - df_fcf['capex'].abs()
+        # year/report_code로 원본 merge해서 release_date 가져오기
+        acct_groups['FCF'] = pd.merge(df_fcf, report_dates, on=['year', 'reprt_code'], how='left')
+
+    # 영업이익률 추가 (매출액과 영업이익이 모두 있는 보고서만)
+    if '매출액' in acct_groups and '영업이익' in acct_groups:
+        df_rev = acct_groups['매출액'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'rev'})
+        df_op = acct_groups['영업이익'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'op'})
+        df_margin = pd.merge(df_rev, df_op, on=['year', 'reprt_code'], how='inner')
+        if not df_margin.empty:
+            # 매출액이 0이면 영업이익률 0으로 처리 (0으로 나누지 않도록 분모를 1로 바꿔 계산)
+            rev = df_margin['rev'].to_numpy(dtype=np.float64, na_value=np.nan)
+            op = df_margin['op'].to_numpy(dtype=np.float64, na_value=np.nan)
+            df_margin['amount'] = np.where(rev != 0, op / np.where(rev == 0, 1, rev) * 100, 0)
+            acct_groups['영업이익률'] = pd.merge(df_margin, report_dates, on=['year', 'reprt_code'], how='left')
+
+    # 체크 리스트
+    check_items = [
+        ("매출액 추이 (3년 연속 상승)", '매출액', 'year', 'growth'),
+        ("매출액 추이 (3분기 연속 상승)", '매출액', 'quarter', 'growth'),
+        ("영업이익 추이 (3년 연속 상승)", '영업이익', 'year', 'growth'),
+        ("영업이익 추이 (3분기 연속 상승)", '영업이익', 'quarter', 'growth'),
+        ("영업이익률 추이 (3년 연속 상승)", '영업이익률', 'year', 'growth'),
+        ("영업이익률 추이 (3분기 연속 상승)", '영업이익률', 'quarter', 'growth'),
+        ("당기순이익 추이 (3년 연속 상승)", '당기순이익', 'year', 'growth'),
+        ("당기순이익 추이 (3분기 연속 상승)", '당기순이익', 'quarter', 'growth'),
+        ("FCF (3년 연속 흑자)", 'FCF', 'year', 'surplus'),
+        ("FCF (3분기 연속 흑자)", 'FCF', 'quarter', 'surplus'),
+    ]
     
-    if 'breakout' in condition:
-        ma_periods.add(condition['breakout']['target_ma'])
+    results = []
+    
+    # Growth/Surplus Check Function (항목별 행 수가 적어 pandas 정렬/중복제거 대신 NumPy 배열로 처리)
+    def check_status(item, period, mode):
+        df_item = acct_groups.get(item)
+        if df_item is None: return "데이터 없음"
+        
+        amounts = df_item['amount'].to_numpy()
+        if period == 'year':
+            annual = df_item['reprt_code'].to_numpy() == '11011'
+            years = df_item['year'].to_numpy()[annual]
+            order = np.argsort(years, kind='stable')
+            sorted_years = years[order]
+            # 같은 연도가 여러 행이면 마지막 행만 유지 (drop_duplicates keep='last')
+            is_last = np.append(sorted_years[1:] != sorted_years[:-1], True)
+            vals = amounts[annual][order][is_last]
+        else:
+            order = np.argsort(df_item['release_date'].to_numpy(), kind='stable')
+            vals = amounts[order]
+            
+        if len(vals) < 4: return "데이터 부족"
+        
+        # 최근 4개 (v0 -> v1 -> v2 -> v3(최근))
+        v = vals[-4:]
+        v0, v1, v2, v3 = v[0], v[1], v[2], v[3]
+        
+        if mode == 'growth':
+            # 단순 상승 여부 (>0 성장)
+            try:
+                cond = (v1 > v0) and (v2 > v1) and (v3 > v2)
+                return "✅ 만족" if cond else "❌ 불만족"
+            except: return "계산 오류"
+        elif mode == 'surplus':
+            # 흑자 지속 (값 > 0) -> 최근 3개만 보면 됨? "연속 3년/3분기"
+            # v1, v2, v3가 0보다 큰지
+            try:
+                cond = (v1 > 0) and (v2 > 0) and (v3 > 0)
+                return "✅ 만족" if cond else "❌ 불만족"
+            except: return "계산 오류"
+    
+    for label, item, period, mode in check_items:
+        status = check_status(item, period, mode)
+        results.append((label, status))
         
-    df = calculate_mas(df, periods=list(ma_periods))
+    # 부채비율 (최근 분기 100% 이하)
+    try:
+        df_liab = acct_groups.get('부채총계')
+        df_eq = acct_groups.get('자본총계')
+        if df_liab is not None and df_eq is not None:
+            try:
+                # 가장 최근 공시 행만 필요하므로 정렬 없이 공시일 최대값 위치로 조회
+                last_liab = df_liab.at[df_liab['release_date'].idxmax(), 'amount']
+                last_eq = df_eq.at[df_eq['release_date'].idxmax(), 'amount']
+                if last_eq > 0:
+                    debt_ratio = (last_liab / last_eq) * 100
+                    debt_status = "✅ 만족" if debt_ratio <= 100 else f"❌ 불만족 ({debt_ratio:.1f}%)"
+                else:
+                    debt_status = "자본잠식"
+            except: debt_status = "데이터 오류"
+        else: debt_status = "데이터 없음"
+    except: debt_status = "데이터 없음"
+    
+    results.append(("부채비율 (최근 분기 100% 이하)", debt_status))
+    
+    return pd.DataFrame(results, columns=["항목", "결과"])
+
+@st.cache_resource
+def get_http_session():
+    """시세 다운로드에 공유할 HTTP 세션. 스캔 스레드 수만큼 keep-alive 연결을 유지합니다."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=SCAN_MAX_WORKERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def install_shared_http_session():
+    """
+    FinanceDataReader는 세션 인자 없이 요청마다 requests.get을 호출해 종목마다 새 연결(TLS 핸드셰이크)을 맺습니다.
+    일별 시세 리더 모듈이 참조하는 requests를 공유 세션으로 바꿔 연결을 재사용합니다. (두 모듈 모두 requests.get만 사용)
+    """
+    session = get_http_session()
+    for module_name in ['FinanceDataReader.naver.data', 'FinanceDataReader.yahoo.data']:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        module.requests = session
+
+install_shared_http_session()
+
+def fetch_ohlcv(code, start, end, retries=3, backoff=0.5):
+    """fdr.DataReader로 시세를 가져옵니다. 일시적인 네트워크 오류는 지수 백오프로 재시도합니다."""
+    for attempt in range(retries):
+        try:
+            return fdr.DataReader(code, start, end)
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+@st.cache_resource
+def get_ohlcv_cache_locks():
+    """종목별 디스크 캐시 파일 잠금. 스크립트 재실행/세션 간에 공유되도록 리소스로 보관합니다."""
+    return {}
+
+def same_price_basis(cached, fetched):
+    """
+    겹치는 거래일의 시가/종가가 캐시와 새로 받은 시세에서 같은지 확인합니다.
+    수정주가는 액면분할/무상증자/유상증자 등이 있으면 과거 가격 전체가 다시 계산되므로, 값이 다르면 기준이 바뀐 것입니다.
+    """
+    overlap = cached.index.intersection(fetched.index)
+    if overlap.empty:
+        return False # 비교할 수 없으면 기준이 바뀐 것으로 간주
+    cols = ['Open', 'Close']
+    old = cached.loc[overlap, cols].to_numpy(dtype=np.float64)
+    new = fetched.loc[overlap, cols].to_numpy(dtype=np.float64)
+    return np.allclose(old, new, rtol=1e-6, equal_nan=True)
+
+def load_ohlcv_from_disk(code, start, end):
+    """
+    로컬 Parquet 캐시에서 시세를 읽습니다.
+    캐시가 요청 기간을 덮지 못하면 부족한 구간만 내려받아 기존 데이터와 병합한 뒤 다시 저장합니다.
+    이어받은 구간이 캐시와 수정주가 기준이 다르면 섞이지 않도록 전체 구간을 다시 받아 파일을 새로 씁니다.
+    """
+    path = os.path.join(OHLCV_CACHE_DIR, f"{code}.parquet")
+    start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+    # 당일 시세는 장중에 바뀌므로 어제까지만 확정된 구간으로 기록
+    settled_end = min(end_ts, pd.Timestamp(datetime.date.today()) - pd.Timedelta(days=1))
+
+    # 스캔 스레드들이 같은 파일을 동시에 쓰지 않도록 종목별로 잠금
+    with get_ohlcv_cache_locks().setdefault(code, threading.Lock()):
+        cached = None
+        if os.path.exists(path):
+            try:
+                cached = pd.read_parquet(path)
+                cached_start = pd.Timestamp(cached.attrs['cache_start'])
+                cached_end = pd.Timestamp(cached.attrs['cache_end'])
+            except Exception:
+                cached = None # 손상되었거나 형식이 다른 캐시는 무시하고 새로 받음
+
+        if cached is not None and cached_start <= start_ts and end_ts <= cached_end:
+            return cached.loc[start_ts:end_ts]
+
+        df = None
+        if cached is not None and cached_start <= start_ts:
+            # 앞부분은 캐시에 있으므로 이후 구간만 받되, 확정 구간의 마지막 몇 거래일을 겹쳐 받아 가격 기준을 비교
+            settled = cached.loc[:cached_end]
+            if not settled.empty:
+                overlap_start = settled.index[max(len(settled) - OHLCV_OVERLAP_BARS, 0)]
+                fetched = fetch_ohlcv(code, overlap_start.date().isoformat(), end)
+                if fetched.empty or same_price_basis(settled, fetched):
+                    df = pd.concat([cached, fetched])
+                    df = df[~df.index.duplicated(keep='last')].sort_index()
+                    df.attrs['cache_start'] = cached.attrs['cache_start']
+                    df.attrs['cache_end'] = max(cached_end, settled_end).date().isoformat()
+
+        if df is None:
+            # 캐시가 없거나, 요청 시작일이 더 이르거나, 수정주가 기준이 바뀌었으면 기존 범위까지 포함해 한 번에 받음
+            fetch_start = start_ts if cached is None else min(start_ts, cached_start)
+            fetch_end = end if cached is None else max(end_ts, cached_end).date().isoformat()
+            df = fetch_ohlcv(code, fetch_start.date().isoformat(), fetch_end)
+            if df.empty:
+                return df
+            df.attrs['cache_start'] = fetch_start.date().isoformat()
+            df.attrs['cache_end'] = (settled_end if cached is None else max(cached_end, settled_end)).date().isoformat()
+
+        try:
+            os.makedirs(OHLCV_CACHE_DIR, exist_ok=True)
+            tmp_path = path + '.tmp'
+            df.to_parquet(tmp_path, compression='zstd')
+            os.replace(tmp_path, path) # 읽는 쪽이 쓰다 만 파일을 보지 않도록 교체 방식으로 저장
+        except Exception:
+            pass # 디스크 캐시 저장 실패는 무시 (다음 호출 때 다시 받음)
+
+        return df.loc[start_ts:end_ts]
+
+def exact_in_float32(values):
+    """값이 모두 2**24 미만의 정수(NaN 제외)라서 float32로 바꿔도 그대로 표현되는지 확인합니다."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    return bool(np.all(np.mod(values, 1) == 0) and np.all(np.abs(values) < 2 ** 24))
+
+def downcast_ohlcv(df):
+    """
+    가격은 float32, 거래량은 int32로 줄여 메모리 사용량을 절반으로 줄입니다.
+    가격에 소수점이 있거나(야후 등 해외 시세) 2**24 이상이면 float32에서 값이 바뀌므로 float64로 유지합니다. (거래량도 int32 범위를 넘으면 유지)
+    """
+    dtypes = {c: 'float32' for c in ['Open', 'High', 'Low', 'Close'] if c in df.columns and exact_in_float32(df[c])}
+    if 'Volume' in df.columns and df['Volume'].dtype.kind in 'iu':
+        if df.empty or df['Volume'].max() <= np.iinfo(np.int32).max:
+            dtypes['Volume'] = 'int32'
+    return df.astype(dtypes)
+
+@st.cache_data(ttl=3600, max_entries=5000, show_spinner=False)
+def load_ohlcv(code, fetch_start, end_date):
+    """종목 시세를 캐시하여 가져옵니다. 캐시 키가 세션 간에 동일하도록 날짜는 ISO 문자열로 받습니다."""
+    df = load_ohlcv_from_disk(code, fetch_start, end_date)
+    # 조건 계산에 쓰이는 열(시가/종가/거래량)만 남겨 메모리 캐시와 연산 대상 버퍼를 줄임 (디스크 캐시는 원본 유지)
+    return downcast_ohlcv(df.filter(items=OHLCV_COLUMNS))
+
+@st.cache_data(ttl=3600, max_entries=5000, show_spinner=False)
+def compute_signals(code, start_date, end_date, condition):
+    """시세 로드와 이평선/조건 계산 결과(종가, 신호 위치)를 캐시합니다. 보유 기간(n_days)과 무관하므로 n_days만 바꾸면 재계산하지 않습니다."""
+    # 데이터 로드 (이평선 계산을 위해 앞부분 데이터 여유있게 로드)
+    fetch_start = start_date - datetime.timedelta(days=200) 
+    df = load_ohlcv(code, fetch_start.isoformat(), end_date.isoformat())
+    
+    if df.empty:
+        return None
+
+    # 필요한 이평선 기간 추출 (차트가 제거되어 조건에 쓰이는 이평선만 계산)
+    df = calculate_mas(df, periods=list(required_ma_periods(condition)))
     
     # 기본적 분석 데이터 처리
     # Tab 2에서만 condition['fundamental']이 들어올 것임.
@@ -528,49 +924,83 @@ def backtest_single_stock(code, name, start_date, end_date, condition, n_days):
              df['Fundamental'] = False
     
     # 조건 만족 여부 체크
-    df['Signal'] = check_conditions(df, condition)
+    signal = check_conditions(df, condition)
     
     # 검색 기간 내의 데이터만 필터링
-    mask_period = (df.index >= pd.to_datetime(start_date)) & (df.index <= pd.to_datetime(end_date))
-    target_df = df.loc[mask_period & df['Signal']].copy()
+    # 인덱스가 날짜순으로 정렬되어 있으므로 이진 탐색으로 구간 경계만 구함 (전체 길이 비교 배열 생성 없음)
+    lo = df.index.searchsorted(pd.Timestamp(start_date), side='left')
+    hi = df.index.searchsorted(pd.Timestamp(end_date), side='right')
+    # 신호 발생일의 정수 위치를 한 번에 구함 (신호마다 get_loc로 날짜를 조회하지 않음)
+    positions = lo + np.flatnonzero(signal.to_numpy()[lo:hi])
     
-    results = []
+    # 청산가 계산에는 종가만 필요하므로 종가 Series만 캐시
+    return df['Close'], positions
+
+def evaluate_exits(close, positions, name, n_days):
+    """신호 위치에서 N거래일 후 종가로 청산한 결과표를 만듭니다. (신호 수에 비례하는 배열 인덱싱만 수행)"""
+    # N일 후 위치 (거래일 기준)
+    # 입력한 수치가 매매 후 가장 최근 날짜까지의 일수보다도 높다면, 자동으로 가장 최근 날짜까지만 계산
+    future_positions = np.minimum(positions + n_days, len(close) - 1)
     
-    for date in target_df.index:
-        # 매수일 종가
-        entry_price = target_df.loc[date, 'Close']
-        
-        # N일 후 날짜 찾기 (거래일 기준)
-        # 전체 df에서 현재 날짜의 정수 인덱스를 찾고 N을 더함
-        try:
-            current_idx = df.index.get_loc(date)
-            future_idx = current_idx + n_days
-            
-            # 입력한 수치가 매매 후 가장 최근 날짜까지의 일수보다도 높다면, 자동으로 가장 최근 날짜까지만 계산
-            if future_idx >= len(df):
-                future_idx = len(df) - 1
-            
-            # 미래 시점의 데이터가 현재보다 뒤에 있는 경우에만 계산
-            if future_idx > current_idx:
-                exit_date = df.index[future_idx]
-                exit_price = df.iloc[future_idx]['Close']
-                
-                pct_change = (exit_price - entry_price) / entry_price * 100
-                result = "상승" if pct_change > 0 else "하락"
-                
-                results.append({
-                    '종목명': name,
-                    '매수일': date.strftime('%Y-%m-%d'),
-                    '매수가': entry_price,
-                    f'{n_days}일후 날짜': exit_date.strftime('%Y-%m-%d'),
-                    f'{n_days}일후 가격': exit_price,
-                    '수익률(%)': round(pct_change, 2),
-                    '결과': result
-                })
-        except Exception:
-            continue
+    # 미래 시점의 데이터가 현재보다 뒤에 있는 경우에만 계산
+    valid = future_positions > positions
+    positions = positions[valid]
+    future_positions = future_positions[valid]
+    
+    # 가격은 float32로 저장될 수 있으므로 수익률 계산/표시는 float64로 수행
+    close_arr = close.to_numpy()
+    entry_prices = close_arr[positions].astype(np.float64)
+    exit_prices = close_arr[future_positions].astype(np.float64)
+    pct_changes = (exit_prices - entry_prices) / entry_prices * 100
+    
+    # 결과 테이블은 열 단위 배열로 한 번에 생성
+    results = {
+        '종목명': name,
+        '매수일': close.index[positions].strftime('%Y-%m-%d'),
+        '매수가': entry_prices,
+        f'{n_days}일후 날짜': close.index[future_positions].strftime('%Y-%m-%d'),
+        f'{n_days}일후 가격': exit_prices,
+        '수익률(%)': np.round(pct_changes, 2),
+        '결과': np.where(pct_changes > 0, "상승", "하락")
+    }
             
-    return pd.DataFrame(results), df
+    return pd.DataFrame(results)
+
+def backtest_single_stock(code, name, start_date, end_date, condition, n_days):
+    """단일 종목에 대해 백테스팅을 수행합니다."""
+    signals = compute_signals(code, start_date, end_date, condition)
+    
+    if signals is None:
+        return None
+
+    close, positions = signals
+    return evaluate_exits(close, positions, name, n_days)
+
+def scan_single_stock(code, name, start_date, end_date, condition, n_days, stop_event):
+    """전체 종목 스캔용: 단일 종목 백테스트 결과를 SCAN_RESULT_COLUMNS 순서의 요약 튜플로 반환합니다. (신호 없음/승률 미달/중지/오류 시 None)"""
+    if stop_event.is_set():
+        return None
+
+    try:
+        # 개별 종목 백테스트 실행
+        res = backtest_single_stock(code, name, start_date, end_date, condition, n_days)
+    except Exception:
+        # 한 종목의 데이터 오류로 전체 스캔이 중단되지 않도록 건너뜀
+        return None
+
+    if res is None or res.empty:
+        return None
+
+    # 해당 종목의 평균 성과를 요약 (수익률 배열 하나로 계산해 필터링된 표를 만들지 않음)
+    vals = res['수익률(%)'].to_numpy()
+    count = vals.size
+    avg_ret = vals.mean()
+    win_rt = round((vals > 0).mean() * 100, 2)
+    # 승률 미달 종목은 결과에 담지 않음 (표시 기준과 같게 반올림한 승률로 비교)
+    if win_rt < SCAN_MIN_WIN_RATE:
+        return None
+
+    return (name, code, count, round(avg_ret, 2), win_rt)
 
 def render_ma_input(label, default_val, key):
     """드롭다운과 숫자 입력을 결합한 UI를 렌더링합니다."""
@@ -613,6 +1043,9 @@ with st.sidebar:
     opendart_api_key = st.text_input("OpenDart API Key", value=default_api_key, type="password", help="OpenDart API Key가 필요합니다.")
     if not default_api_key:
          st.caption("💡 'opendart_api_key.txt' 파일을 생성하여 키를 저장하면 자동 입력됩니다.")
+    if st.button("재무제표 캐시 비우기", help="저장된 DART 재무제표를 지우고 다음 분석 때 다시 조회합니다. (정정공시 반영)"):
+        clear_dart_cache()
+        st.toast("재무제표 캐시를 비웠습니다.")
 
     st.header("시장 및 기간 설정")
     
@@ -723,10 +1156,10 @@ with tab1:
     st.markdown("### 설정한 조건에서 검색한 종목의 승률 및 수익률을 확인합니다.")
     st.markdown("")
     
-    stock_list = get_stock_list(market_select, uploaded_file)
     # 검색 편의를 위해 "종목명 (코드)" 형식으로 리스트 생성
-    stock_choices = stock_list.apply(lambda x: f"{x['Name']} ({x['Code']})", axis=1)
-    selected_stock_str = st.selectbox("종목 검색", stock_choices)
+    # 선택값은 문자열을 다시 파싱하지 않고 (종목명, 코드) 매핑으로 되찾음
+    stock_lookup = get_stock_choices(market_select, uploaded_file)
+    selected_stock_str = st.selectbox("종목 검색", list(stock_lookup))
 
     st.markdown("")
     
@@ -734,11 +1167,10 @@ with tab1:
         st.session_state['single_backtest_active'] = True
 
     if st.session_state.get('single_backtest_active', False):
-        name = selected_stock_str.split(' (')[0]
-        code = selected_stock_str.split(' (')[1][:-1]
+        name, code = stock_lookup[selected_stock_str]
         
         with st.spinner(f'{name} 데이터를 분석 중입니다...'):
-            result_df, df = backtest_single_stock(code, name, start_date, end_date, condition_params, n_days)
+            result_df = backtest_single_stock(code, name, start_date, end_date, condition_params, n_days)
             
             if result_df is not None and not result_df.empty:
                 st.success("분석 완료!")
@@ -768,126 +1200,13 @@ with tab1:
                     # 데이터 가져오기 (3년전 ~ 현재)
                     fund_start_year = start_date.year - 4
                     fund_end_year = end_date.year
-                    fund_df = get_fundamental_data(opendart_api_key, code, fund_start_year, fund_end_year)
+                    fund_results = compute_fund_results(opendart_api_key, code, fund_start_year, fund_end_year)
                     
-                    if fund_df is None or fund_df.empty:
+                    if fund_results is None:
                         st.error("재무 데이터를 가져올 수 없습니다.")
                     else:
-                        # 데이터 전처리 (금액 수치화, FCF 계산, 영업이익률 계산, 공시일 계산 등)
-                        # process_fundamental_data 내부 로직 일부 재사용하거나 별도 처리
-                        # 여기서는 화면 표시용이므로 직관적으로 계산
-                        
-                        # 1. 전처리
-                        fund_df['amount'] = pd.to_numeric(fund_df['thstrm_amount'].str.replace(',', ''), errors='coerce')
-                        
-                        # 공시일(release_date)
-                        def get_release_date_local(row):
-                            y = int(row['year'])
-                            rc = row['reprt_code']
-                            if rc == '11013': return pd.Timestamp(f"{y}-05-15")
-                            elif rc == '11012': return pd.Timestamp(f"{y}-08-14")
-                            elif rc == '11014': return pd.Timestamp(f"{y}-11-14")
-                            elif rc == '11011': return pd.Timestamp(f"{y+1}-03-31")
-                            return pd.Timestamp(f"{y}-12-31")
-                        fund_df['release_date'] = fund_df.apply(get_release_date_local, axis=1)
-
-                        # FCF 추가
-                        try:
-                            df_ocf = fund_df[fund_df['account_nm']=='영업활동현금흐름'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'ocf'})
-                            df_capex = fund_df[fund_df['account_nm']=='유형자산의취득'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'capex'})
-                            
-                            df_fcf = pd.merge(df_ocf, df_capex, on=['year', 'reprt_code'], how='left').fillna(0)
-                            df_fcf['amount'] = df_fcf['ocf'] - df_fcf['capex'].abs()
-                            df_fcf['account_nm'] = 'FCF'
-                            # release_date 등 병합 생략하고 concat용으로 최소화
-                            # year/report_code로 원본 merge해서 release_date 가져오기
-                            df_fcf = pd.merge(df_fcf, fund_df[['year', 'reprt_code', 'release_date']].drop_duplicates(), on=['year', 'reprt_code'], how='left')
-                            fund_df = pd.concat([fund_df, df_fcf], ignore_index=True)
-                        except: pass
-
-                        # 영업이익률 추가
-                        try:
-                            df_rev = fund_df[fund_df['account_nm']=='매출액'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'rev'})
-                            df_op = fund_df[fund_df['account_nm']=='영업이익'][['year', 'reprt_code', 'amount']].rename(columns={'amount': 'op'})
-                            df_margin = pd.merge(df_rev, df_op, on=['year', 'reprt_code'], how='inner')
-                            df_margin['amount'] = df_margin.apply(lambda x: (x['op'] / x['rev'] * 100) if x['rev'] != 0 else 0, axis=1)
-                            df_margin['account_nm'] = '영업이익률'
-                            df_margin = pd.merge(df_margin, fund_df[['year', 'reprt_code', 'release_date']].drop_duplicates(), on=['year', 'reprt_code'], how='left')
-                            fund_df = pd.concat([fund_df, df_margin], ignore_index=True)
-                        except: pass
-
-                        # 체크 리스트
-                        check_items = [
-                            ("매출액 추이 (3년 연속 상승)", '매출액', 'year', 'growth'),
-                            ("매출액 추이 (3분기 연속 상승)", '매출액', 'quarter', 'growth'),
-                            ("영업이익 추이 (3년 연속 상승)", '영업이익', 'year', 'growth'),
-                            ("영업이익 추이 (3분기 연속 상승)", '영업이익', 'quarter', 'growth'),
-                            ("영업이익률 추이 (3년 연속 상승)", '영업이익률', 'year', 'growth'),
-                            ("영업이익률 추이 (3분기 연속 상승)", '영업이익률', 'quarter', 'growth'),
-                            ("당기순이익 추이 (3년 연속 상승)", '당기순이익', 'year', 'growth'),
-                            ("당기순이익 추이 (3분기 연속 상승)", '당기순이익', 'quarter', 'growth'),
-                            ("FCF (3년 연속 흑자)", 'FCF', 'year', 'surplus'),
-                            ("FCF (3분기 연속 흑자)", 'FCF', 'quarter', 'surplus'),
-                        ]
-                        
-                        results = []
-                        
-                        # Growth/Surplus Check Function
-                        def check_status(item, period, mode):
-                            df_item = fund_df[fund_df['account_nm'] == item].copy()
-                            if df_item.empty: return "데이터 없음"
-                            
-                            if period == 'year':
-                                df_target = df_item[df_item['reprt_code'] == '11011'].sort_values('year').drop_duplicates(['year'], keep='last')
-                            else:
-                                df_target = df_item.sort_values('release_date')
-                                
-                            vals = df_target['amount'].values
-                            if len(vals) < 4: return "데이터 부족"
-                            
-                            # 최근 4개 (v0 -> v1 -> v2 -> v3(최근))
-                            v = vals[-4:]
-                            v0, v1, v2, v3 = v[0], v[1], v[2], v[3]
-                            
-                            if mode == 'growth':
-                                # 단순 상승 여부 (>0 성장)
-                                try:
-                                    cond = (v1 > v0) and (v2 > v1) and (v3 > v2)
-                                    return "✅ 만족" if cond else "❌ 불만족"
-                                except: return "계산 오류"
-                            elif mode == 'surplus':
-                                # 흑자 지속 (값 > 0) -> 최근 3개만 보면 됨? "연속 3년/3분기"
-                                # v1, v2, v3가 0보다 큰지
-                                try:
-                                    cond = (v1 > 0) and (v2 > 0) and (v3 > 0)
-                                    return "✅ 만족" if cond else "❌ 불만족"
-                                except: return "계산 오류"
-                        
-                        for label, item, period, mode in check_items:
-                            status = check_status(item, period, mode)
-                            results.append((label, status))
-                            
-                        # 부채비율 (최근 분기 100% 이하)
-                        try:
-                            df_liab = fund_df[fund_df['account_nm']=='부채총계'].sort_values('release_date')
-                            df_eq = fund_df[fund_df['account_nm']=='자본총계'].sort_values('release_date')
-                            if not df_liab.empty and not df_eq.empty:
-                                try:
-                                    last_liab = df_liab.iloc[-1]['amount']
-                                    last_eq = df_eq.iloc[-1]['amount']
-                                    if last_eq > 0:
-                                        debt_ratio = (last_liab / last_eq) * 100
-                                        debt_status = "✅ 만족" if debt_ratio <= 100 else f"❌ 불만족 ({debt_ratio:.1f}%)"
-                                    else:
-                                        debt_status = "자본잠식"
-                                except: debt_status = "데이터 오류"
-                            else: debt_status = "데이터 없음"
-                        except: debt_status = "데이터 없음"
-                        
-                        results.append(("부채비율 (최근 분기 100% 이하)", debt_status))
-                        
                         # 결과 출력
-                        st.table(pd.DataFrame(results, columns=["항목", "결과"]))
+                        st.table(fund_results)
 
             else:
                 st.warning("설정된 기간 내에 조건에 부합하는 신호가 없습니다.")
@@ -916,9 +1235,8 @@ with tab2:
         st.session_state['limit_slider'] = st.session_state['limit_num']
 
     # 전체 종목 수 계산 (최대값 설정을 위해)
-    # 캐싱된 함수 호출로 성능 부하 최소화
-    current_stock_list = get_stock_list(market_select, uploaded_file)
-    total_stock_count = len(current_stock_list) if not current_stock_list.empty else 200
+    # 시장/업로드 파일이 바뀔 때만 다시 계산
+    total_stock_count = get_stock_count(market_select, uploaded_file)
 
     col_l1, col_l2 = st.columns([5, 1])
     with col_l1:
@@ -994,77 +1312,103 @@ with tab2:
                     fund_conditions_tab2['debt_ratio'] = debt_limit
 
 
-    col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 1])
-    with col_btn1:
-        start_scan = st.button("시가총액 상위 종목 검색", key='scan_top', use_container_width=True)
-    with col_btn2:
-        start_all = st.button("전체 종목 검색", key='scan_all', use_container_width=True)
-    with col_btn3:
-        stop_scan = st.button("검색 중지", key='stop_scan', use_container_width=True)
-
-    if stop_scan:
-        st.warning("검색이 중지되었습니다.")
-        st.stop()
-
-    if start_scan or start_all:
-        # Tab 2 전용 조건을 통합
-        scan_conditions = condition_params.copy()
-        if fund_conditions_tab2:
-            scan_conditions['fundamental'] = fund_conditions_tab2
+    @st.fragment
+    def render_scan_section(scan_conditions):
+        """검색 버튼, 진행 상황, 결과 영역. 검색 버튼은 이 영역만 다시 실행하도록 fragment로 분리합니다."""
+        # 검색 결과가 어떤 설정으로 만들어졌는지 확인하기 위한 현재 검색 설정
+        scan_inputs = {
+            'conditions': scan_conditions,
+            'n_days': n_days,
+            'market': market_select,
+            'upload': hash_uploaded_file(uploaded_file) if uploaded_file is not None else None,
+            'period': (start_date, end_date),
+        }
+
+        col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 1])
+        with col_btn1:
+            start_scan = st.button("시가총액 상위 종목 검색", key='scan_top', use_container_width=True)
+        with col_btn2:
+            start_all = st.button("전체 종목 검색", key='scan_all', use_container_width=True)
+        with col_btn3:
+            stop_scan = st.button("검색 중지", key='stop_scan', use_container_width=True)
+
+        if stop_scan:
+            st.warning("검색이 중지되었습니다.")
+            st.stop()
+
+        if start_scan or start_all:
+            stock_list = get_stock_list(market_select, uploaded_file)
             
-        stock_list = get_stock_list(market_select, uploaded_file)
-        
-        if start_all:
-            target_stocks = stock_list
-            st.info(f"선택한 시장의 전체 종목 ({len(target_stocks)}개)을 검색합니다. 시간이 오래 걸릴 수 있습니다.")
-        else:
-            # 상위 N개만 테스트
-            target_stocks = stock_list.head(limit_num)
-            st.info(f"시가총액 상위 {limit_num}개 종목을 검색합니다.")
-        
-        final_results = []
-        progress_bar = st.progress(0)
-        
-        status_text = st.empty()
-        
-        for idx, row in target_stocks.iterrows():
-            # 진행률 표시
-            progress = (idx + 1) / len(target_stocks)
-            progress_bar.progress(progress)
-            status_text.text(f"분석 중: {row['Name']} ({idx+1}/{len(target_stocks)})")
+            if start_all:
+                target_stocks = stock_list
+                st.info(f"선택한 시장의 전체 종목 ({len(target_stocks)}개)을 검색합니다. 시간이 오래 걸릴 수 있습니다.")
+            else:
+                # 상위 N개만 테스트
+                target_stocks = stock_list.head(limit_num)
+                st.info(f"시가총액 상위 {limit_num}개 종목을 검색합니다.")
             
-            # 개별 종목 백테스트 실행 (df는 스캔에서 불필요)
-            res, _ = backtest_single_stock(row['Code'], row['Name'], start_date, end_date, scan_conditions, n_days)
+            final_results = []
             
-            if res is not None and not res.empty:
-                # 해당 종목의 평균 성과를 요약해서 저장
-                avg_ret = res['수익률(%)'].mean()
-                win_cnt = len(res[res['수익률(%)'] > 0])
-                win_rt = (win_cnt / len(res)) * 100
-                count = len(res)
+            with st.status("검색 중...", expanded=True) as status:
+                progress_bar = st.progress(0)
+
+                # 종목별 백테스트는 서로 독립적이므로 스레드 풀에서 병렬 실행 (데이터 다운로드 대기가 대부분)
+                stop_event = threading.Event()
+                executor = ThreadPoolExecutor(
+                    max_workers=SCAN_MAX_WORKERS,
+                    initializer=add_script_run_ctx,
+                    initargs=(None, get_script_run_ctx()),
+                )
+                try:
+                    # 행마다 Series를 만드는 iterrows 대신 컬럼 배열을 묶어서 순회
+                    codes = target_stocks['Code'].to_numpy()
+                    names = target_stocks['Name'].to_numpy()
+                    futures = {
+                        executor.submit(scan_single_stock, code, name, start_date, end_date, scan_conditions, n_days, stop_event): name
+                        for code, name in zip(codes, names)
+                    }
+                    for i, future in enumerate(as_completed(futures)):
+                        # 진행률 표시 (완료된 작업 수 기준)
+                        progress_bar.progress((i + 1) / len(futures))
+                        status.update(label=f"분석 중: {futures[future]} ({i+1}/{len(futures)})")
+
+                        summary = future.result()
+                        if summary is not None:
+                            final_results.append(summary)
+                finally:
+                    # 검색 중지 등으로 스크립트가 중단되면 대기 중인 작업을 취소
+                    stop_event.set()
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+                progress_bar.empty()
+                status.update(label="검색 완료!", state="complete", expanded=False)
+
+            # 다른 위젯 조작으로 재실행되어도 다시 검색하지 않도록 결과를 세션에 보관
+            st.session_state['scan_results'] = final_results
+            st.session_state['scan_inputs'] = scan_inputs
+
+        # 검색 후 조건/보유 기간/시장/기간이 바뀌었으면 이전 결과는 현재 설정과 맞지 않으므로 지움
+        if 'scan_results' in st.session_state and st.session_state.get('scan_inputs') != scan_inputs:
+            del st.session_state['scan_results']
+            st.session_state.pop('scan_inputs', None)
+
+        # 결과 요약 (마지막 검색 결과)
+        if 'scan_results' in st.session_state:
+            final_results = st.session_state['scan_results']
+            if final_results:
+                # 승률 50% 이상 종목만 scan_single_stock에서 걸러져 들어옴
+                result_summary = pd.DataFrame(final_results, columns=SCAN_RESULT_COLUMNS)
+                # 평균 수익률 순으로 정렬
+                result_summary = result_summary.sort_values(by='평균 수익률(%)', ascending=False)
                 
-                final_results.append({
-                    '종목명': row['Name'],
-                    '종목코드': row['Code'],
-                    '발생 횟수': count,
-                    '평균 수익률(%)': round(avg_ret, 2),
-                    '승률(%)': round(win_rt, 2)
-                })
-
-        # 결과 요약 (scan_conditions 사용)
-        
-        status_text.text("검색 완료!")
-        progress_bar.empty()
-        
-        if final_results:
-            result_summary = pd.DataFrame(final_results)
-            # 평균 수익률 순으로 정렬
-            result_summary = result_summary.sort_values(by='평균 수익률(%)', ascending=False)
-            
-            # 승률 50% 이상 필터링
-            filtered_summary = result_summary[result_summary['승률(%)'] >= 50.0]
-            
-            st.write(f"검색 결과: 총 {len(filtered_summary)}개 종목 발견 (승률 50% 이상)")
-            st.dataframe(filtered_summary, use_container_width=True)
-        else:
-            st.warning("조건을 만족하는 종목을 찾지 못했습니다.")
\ No newline at end of file
+                st.write(f"검색 결과: 총 {len(result_summary)}개 종목 발견 (승률 50% 이상)")
+                st.dataframe(result_summary, use_container_width=True)
+            else:
+                st.warning("조건을 만족하는 종목을 찾지 못했습니다.")
+
+    # Tab 2 전용 조건을 통합
+    scan_conditions = condition_params.copy()
+    if fund_conditions_tab2:
+        scan_conditions['fundamental'] = fund_conditions_tab2
+
+    render_scan_section(scan_conditions)
@@ -1,6 +1,7 @@
 import FinanceDataReader as fdr
 import pandas as pd
 
+df = None
 try:
     print("Attempting to fetch KOSPI list via FDR...")
     df = fdr.StockListing('KOSPI')
@@ -8,9 +9,27 @@ try:
 except Exception as e:
     print(f"FDR Failed: {e}")
 
+if df is not None:
+    try:
+        # app.py는 FDR 조회가 실패하면 이 Parquet 스냅샷을 CSV보다 먼저 읽음
+        print("\nSaving Parquet snapshot...")
+        df.to_parquet('kospi_stocks.parquet', compression='zstd')
+        print("Saved kospi_stocks.parquet.")
+    except Exception as e:
+        print(f"Parquet Write Failed: {e}")
+
+# app.py의 로컬 대체 파일을 읽는 순서대로 각각 확인
+try:
+    print("\nReading local Parquet snapshot...")
+    df_local = pd.read_parquet('kospi_stocks.parquet', columns=['Code'])
+    print(f"Parquet snapshot contains {len(df_local)} rows.")
+except Exception as e:
+    print(f"Parquet Read Failed: {e}")
+
 try:
     print("\nReading local CSV...")
-    df_csv = pd.read_csv('kospi_stocks.csv')
+    # 행 수만 확인하므로 첫 번째 열만 읽음
+    df_csv = pd.read_csv('kospi_stocks.csv', usecols=[0])
     print(f"CSV contains {len(df_csv)} rows.")
 except Exception as e:
     print(f"CSV Read Failed: {e}")